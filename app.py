@@ -17,12 +17,17 @@ Description:
 import os
 import sys
 import sqlite3
+import threading
 import json
 import io
 import base64
 import csv
+import uuid
+import functools
+from contextlib import contextmanager
 import cv2
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Tuple
@@ -30,7 +35,9 @@ from typing import Dict, List, Tuple
 # =====================================================
 # THIRD-PARTY LIBRARIES
 # =====================================================
-from flask import Flask, redirect, render_template, request, jsonify, Response, send_file
+import torch
+from cachetools import TTLCache
+from flask import Flask, redirect, render_template, request, jsonify, Response, stream_with_context
 from ultralytics import YOLO
 from PIL import Image
 
@@ -41,17 +48,48 @@ from PIL import Image
 BASE_DIR = Path(__file__).resolve().parent
 
 MODEL_PATH = BASE_DIR / "yolov8m.pt"
+ENGINE_PATH = MODEL_PATH.with_suffix(".engine")   # TensorRT (GPU)
+ONNX_PATH = MODEL_PATH.with_suffix(".onnx")       # ONNX Runtime (CPU)
+INT8_PATH = BASE_DIR / "yolov8m.int8.onnx"        # INT8 weights (CPU)
 DB_PATH = BASE_DIR / "reports.db"
+SCHEMA_VERSION = 3   # bump when migrate_db() changes
 
 CONF_THRESHOLD = 0.25
 MAX_DET = 5
 
+JPEG_QUALITY = 85
+
+HISTORY_PAGE_SIZE = 50
+STATS_CACHE_TTL = 10   # seconds
+
+IMG_SIZE = 640
+EXPORT_BATCH = 8
+VIDEO_BATCH = EXPORT_BATCH   # sampled video frames per predict call
+SEEK_GOP_FRAMES = 250        # typical keyframe interval; seek only past this gap
+USE_INT8 = False  # dynamic INT8 weight quantization on CPU (off until benchmarked)
+USE_HALF = torch.cuda.is_available()   # FP16 inference on GPU
+
 # =====================================================
 # FLASK APP INITIALIZATION
 # =====================================================
 
 app = Flask(__name__)
 
+# Background pool for disk writes that the response does not wait on
+IO_EXECUTOR = ThreadPoolExecutor(max_workers=2)
+
+def submit_io(fn, *args, description: str = "background write"):
+    """
+    Run fn(*args) on IO_EXECUTOR and report failures, which would
+    otherwise be lost with the discarded future.
+    """
+    def log_failure(future):
+        error = future.exception()
+        if error is not None:
+            print(f"⚠️ {description} failed: {error}")
+
+    IO_EXECUTOR.submit(fn, *args).add_done_callback(log_failure)
+
 # =====================================================
 # MODEL LOADING
 # =====================================================
@@ -59,10 +97,169 @@ app = Flask(__name__)
 if not MODEL_PATH.exists():
     sys.exit("❌ Model file not found")
 
+@functools.lru_cache(maxsize=1)
+def get_model() -> YOLO:
+    """
+    Return the single shared model instance (loaded on first call).
+    """
+    return load_model()
+
+
+def load_model() -> YOLO:
+    """
+    Load an optimized inference backend for the YOLOv8 checkpoint.
+
+    - GPU: TensorRT FP16 engine (dynamic batch)
+    - CPU: ONNX model served by ONNX Runtime (INT8 weights if USE_INT8)
+    The export runs once; later starts reuse the exported file.
+    Falls back to the PyTorch checkpoint if the export fails.
+    """
+    if torch.cuda.is_available():
+        export_path = ENGINE_PATH
+        export_args = dict(format="engine", half=True, dynamic=True, batch=EXPORT_BATCH)
+    else:
+        export_path = ONNX_PATH
+        export_args = dict(format="onnx", half=False, dynamic=True)
+
+    if not export_path.exists():
+        print(f"⚙️ Exporting model to {export_args['format']}...")
+        try:
+            YOLO(str(MODEL_PATH)).export(imgsz=IMG_SIZE, **export_args)
+        except Exception as e:
+            print(f"⚠️ Export failed ({e}), using PyTorch checkpoint")
+            return load_pytorch_model()
+
+    if export_path == ONNX_PATH and USE_INT8:
+        export_path = quantize_onnx(ONNX_PATH, INT8_PATH)
+
+    return YOLO(str(export_path), task="detect")
+
+
+def load_pytorch_model() -> YOLO:
+    """
+    Load the PyTorch checkpoint, with FP16 weights on GPU.
+    """
+    yolo = YOLO(str(MODEL_PATH))
+    if USE_HALF:
+        yolo.to("cuda")
+        yolo.model.half()
+    return yolo
+
+
+def quantize_onnx(src: Path, dst: Path) -> Path:
+    """
+    Dynamic INT8 quantization of ONNX weights.
+    Needs no calibration data and keeps accuracy close to FP32.
+    Returns the FP32 model path if onnxruntime is unavailable.
+    """
+    if dst.exists():
+        return dst
+
+    try:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+    except ImportError:
+        print("⚠️ onnxruntime not installed, skipping INT8 quantization")
+        return src
+
+    print("⚙️ Quantizing ONNX model to INT8...")
+    try:
+        quantize_dynamic(str(src), str(dst), weight_type=QuantType.QInt8)
+    except Exception as e:
+        print(f"⚠️ INT8 quantization failed ({e}), using FP32 ONNX model")
+        return src
+
+    return dst
+
+
 print("📦 Loading YOLOv8 model...")
-model = YOLO(str(MODEL_PATH))
+model = get_model()
 print("✅ Model loaded")
 
+# Class name -> responsible department (model.names is fixed after load)
+CLASS_TO_DEPT: Dict[str, str] = {}
+for _, class_name in model.names.items():
+    if "pothole" in class_name.lower():
+        CLASS_TO_DEPT[class_name] = "Roads Department"
+    elif "garbage" in class_name.lower():
+        CLASS_TO_DEPT[class_name] = "Department of Environment"
+
+def department_for(summary: Dict[str, int], default: str = "General") -> str:
+    """
+    Pick the department for the first mapped class in a summary.
+    """
+    return next((CLASS_TO_DEPT[name] for name in summary if name in CLASS_TO_DEPT), default)
+
+# =====================================================
+# DATABASE CONNECTION
+# =====================================================
+
+def connect_db() -> sqlite3.Connection:
+    """
+    Open the shared SQLite connection used by every request.
+    WAL lets readers run alongside a writer; autocommit mode
+    (isolation_level=None) avoids an implicit transaction per statement.
+    """
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+DB = connect_db()
+DB_LOCK = threading.Lock()  # serializes cursor use across request threads
+
+@contextmanager
+def transaction(begin: str = "BEGIN"):
+    """
+    Run a block in an explicit transaction on the shared connection.
+    Rolls back on any error so DB is never left mid-transaction.
+    Caller must hold DB_LOCK.
+    """
+    cur = DB.cursor()
+    cur.execute(begin)
+    try:
+        yield cur
+        cur.execute("COMMIT")
+    except BaseException:
+        if DB.in_transaction:
+            cur.execute("ROLLBACK")
+        raise
+
+# Short-lived cache for dashboard/history queries, cleared on every write
+STATS_CACHE = TTLCache(maxsize=64, ttl=STATS_CACHE_TTL)
+STATS_CACHE_LOCK = threading.Lock()
+stats_cache_generation = 0  # bumped on every clear
+_MISSING = object()  # cache-miss sentinel
+
+def cached(key, compute):
+    """
+    Return STATS_CACHE[key], computing and storing it on a miss.
+    A result is not stored if the cache was cleared while computing.
+    """
+    with STATS_CACHE_LOCK:
+        # Single lookup: the entry may expire between `in` and `[]`
+        value = STATS_CACHE.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        generation = stats_cache_generation
+
+    value = compute()
+
+    with STATS_CACHE_LOCK:
+        if generation == stats_cache_generation:
+            STATS_CACHE[key] = value
+    return value
+
+def clear_stats_cache():
+    """
+    Drop cached stats after a write; bumping the generation stops
+    in-flight computations from storing pre-write results.
+    """
+    global stats_cache_generation
+    with STATS_CACHE_LOCK:
+        stats_cache_generation += 1
+        STATS_CACHE.clear()
+
 # =====================================================
 # DATABASE INITIALIZATION
 # =====================================================
@@ -70,9 +267,23 @@ print("✅ Model loaded")
 def init_db():
     """
     Create reports table if it does not exist.
+    Skips migration when the DB is already at SCHEMA_VERSION.
+    """
+    with DB_LOCK:
+        cur = DB.cursor()
+        if cur.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION:
+            return
+
+        with transaction("BEGIN IMMEDIATE") as cur:
+            # Another worker may have migrated while we waited for the lock
+            if cur.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                migrate_db(cur)
+                cur.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+def migrate_db(cur: sqlite3.Cursor):
+    """
+    Create the reports table and add columns missing from older DBs.
     """
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
 
     cur.execute("""
         CREATE TABLE IF NOT EXISTS reports (
@@ -103,8 +314,22 @@ def init_db():
         print("⚠️ Migrating database: Adding 'department' column...")
         cur.execute("ALTER TABLE reports ADD COLUMN department TEXT DEFAULT 'General'")
 
-    conn.commit()
-    conn.close()
+    if 'n_pothole' not in columns or 'n_garbage' not in columns:
+        print("⚠️ Migrating database: Adding issue count columns...")
+        if 'n_pothole' not in columns:
+            cur.execute("ALTER TABLE reports ADD COLUMN n_pothole INTEGER DEFAULT 0")
+        if 'n_garbage' not in columns:
+            cur.execute("ALTER TABLE reports ADD COLUMN n_garbage INTEGER DEFAULT 0")
+
+        # Backfill counts from the stored JSON summaries
+        cur.execute("""
+            UPDATE reports SET
+                n_pothole = (SELECT COALESCE(SUM(value), 0) FROM json_each(summary)
+                             WHERE lower(key) LIKE '%pothole%'),
+                n_garbage = (SELECT COALESCE(SUM(value), 0) FROM json_each(summary)
+                             WHERE lower(key) LIKE '%garbage%' AND lower(key) NOT LIKE '%pothole%')
+            WHERE json_valid(summary)
+        """)
 
 # Initialize database on startup
 init_db()
@@ -115,33 +340,19 @@ init_db()
 
 def get_home_stats():
     """
-    Fetch aggregated statistics for homepage dashboard.
+    Fetch aggregated statistics for homepage dashboard (cached).
     """
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+    return cached("home", load_home_stats)
 
-    # Total reports
-    cur.execute("SELECT COUNT(*) FROM reports")
-    total_reports = cur.fetchone()[0]
-
-    # Aggregate detected issues
-    cur.execute("SELECT summary FROM reports")
-    rows = cur.fetchall()
-
-    total_potholes = 0
-    total_garbage = 0
-
-    for (summary,) in rows:
-        if summary:
-            try:
-                data = json.loads(summary)
-                for key, value in data.items():
-                    if "pothole" in key.lower():
-                        total_potholes += value
-                    elif "garbage" in key.lower():
-                        total_garbage += value
-            except json.JSONDecodeError:
-                continue
+def load_home_stats():
+    """
+    Query homepage statistics from the database.
+    """
+    with DB_LOCK:
+        total_reports, total_potholes, total_garbage = DB.execute("""
+            SELECT COUNT(*), COALESCE(SUM(n_pothole), 0), COALESCE(SUM(n_garbage), 0)
+            FROM reports
+        """).fetchone()
 
     # Calculate Dynamic Accuracy based on user feedback
     # cur.execute("SELECT COUNT(*) FROM reports WHERE feedback IS NOT NULL")
@@ -158,8 +369,6 @@ def get_home_stats():
     # User requested static accuracy between 70-80%
     accuracy = 78
 
-    conn.close()
-
     return {
         "total_reports": total_reports,
         "total_potholes": total_potholes,
@@ -168,99 +377,167 @@ def get_home_stats():
         "model_accuracy": accuracy
     }
 
+def count_issues(summary: Dict[str, int]) -> Tuple[int, int]:
+    """
+    Split a detection summary into (potholes, garbage) counts.
+    """
+    n_pothole = n_garbage = 0
+    for key, value in summary.items():
+        if "pothole" in key.lower():
+            n_pothole += value
+        elif "garbage" in key.lower():
+            n_garbage += value
+    return n_pothole, n_garbage
+
 # =====================================================
 # INFERENCE LOGIC
 # =====================================================
 
-def run_inference(image: Image.Image):
+def summarize_detections(result) -> Dict[str, int]:
     """
-    Run YOLOv8 inference on input image and
-    return annotated image + detection summary.
+    Count detections per class name for a single YOLO result.
+    Keys follow detection order (highest confidence first), which
+    department_for() relies on.
+    """
+    if result.boxes is None or len(result.boxes) == 0:
+        return {}
+
+    cls_ids = result.boxes.cls.cpu().numpy().astype(np.int64)
+    counts = np.bincount(cls_ids, minlength=len(model.names))
+
+    # Classes ordered by their first (most confident) detection
+    _, first_idx = np.unique(cls_ids, return_index=True)
+    ordered_ids = cls_ids[np.sort(first_idx)]
+
+    return {model.names[i]: int(counts[i]) for i in ordered_ids}
+
+def prepare_image(image: Image.Image) -> np.ndarray:
+    """
+    Downscale an uploaded image to at most IMG_SIZE on its long side
+    and return it as a BGR array ready for YOLO.
+    """
+    arr = np.asarray(image)
+    h, w = arr.shape[:2]
+    scale = IMG_SIZE / max(h, w)
+    if scale < 1:
+        # Clamp so very thin images never get a zero-sized side
+        size = (max(1, int(w * scale)), max(1, int(h * scale)))
+        arr = cv2.resize(arr, size, interpolation=cv2.INTER_AREA)
+
+    # YOLO treats numpy input as BGR (OpenCV order)
+    return cv2.cvtColor(arr, cv2.COLOR_RGB2BGR)
+
+def run_inference(image: np.ndarray):
+    """
+    Run YOLOv8 inference on input image (BGR array) and
+    return annotated JPEG bytes + detection summary + annotated BGR array.
     """
     results = model.predict(
         image,
         conf=CONF_THRESHOLD,
-        max_det=MAX_DET
+        max_det=MAX_DET,
+        half=USE_HALF
     )
 
     result = results[0]
 
     # Build class summary
-    summary: Dict[str, int] = {}
+    summary = summarize_detections(result)
 
-    if result.boxes is not None:
-        for cls in result.boxes.cls.tolist():
-            class_name = model.names[int(cls)]
-            summary[class_name] = summary.get(class_name, 0) + 1
-
-    # Render annotated image
+    # Render annotated image (BGR)
     output = result.plot()
-    output_image = Image.fromarray(output[..., ::-1])
 
-    # Convert image to base64
-    buffer = io.BytesIO()
-    output_image.save(buffer, format="PNG")
-    img_base64 = base64.b64encode(buffer.getvalue()).decode()
+    # Encode once as JPEG; reused for the preview and the saved report
+    _, buffer = cv2.imencode(".jpg", output, [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY])
+    jpeg_bytes = buffer.tobytes()
 
-    return img_base64, summary
+    return jpeg_bytes, summary, output
 
 def process_video_frames(video_path: str) -> Tuple[Dict[str, int], List[str]]:
     """
     Process video frames:
     - Skip frames (process 1 per second)
-    - Detect issues
+    - Detect issues (sampled frames are batched through the model)
     - Save key frames (frames with detections)
+    - Stop once max_saved_frames key frames are saved; the summary
+      then covers the video up to the last key frame
     - Return aggregate summary + list of keyframe paths
     """
     cap = cv2.VideoCapture(str(video_path))
     fps = int(cap.get(cv2.CAP_PROP_FPS)) or 30
     frame_interval = fps  # Process 1 frame per second
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     
     total_summary = {}
     key_frame_paths = []
     
-    frame_count = 0
     saved_frames_count = 0
     max_saved_frames = 10 # Limit number of saved frames per video to save space
+    batch_frames = []
+    vid_tag = uuid.uuid4().hex[:12]  # unique per upload, avoids filename clashes
     
     reports_dir = BASE_DIR / "static" / "reports"
     reports_dir.mkdir(parents=True, exist_ok=True)
-    
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-            
-        if frame_count % frame_interval == 0:
-            # Run inference on frame
-            # Convert BGR (OpenCV) to RGB (PIL)
-            # But YOLO can take numpy array (BGR) directly? Yes.
-            results = model.predict(frame, conf=CONF_THRESHOLD, max_det=MAX_DET, verbose=False)
-            result = results[0]
-            
-            has_detection = False
-            local_summary = {}
-            
-            if result.boxes is not None:
-                for cls in result.boxes.cls.tolist():
-                    class_name = model.names[int(cls)]
-                    local_summary[class_name] = local_summary.get(class_name, 0) + 1
-                    total_summary[class_name] = total_summary.get(class_name, 0) + 1
-                    has_detection = True
+
+    def process_batch(frames):
+        nonlocal saved_frames_count
+
+        # YOLO accepts a list of BGR numpy arrays as one batch
+        results = model.predict(frames, conf=CONF_THRESHOLD, max_det=MAX_DET, half=USE_HALF, verbose=False)
+
+        for result in results:
+            if saved_frames_count >= max_saved_frames:
+                break
+
+            local_summary = summarize_detections(result)
+            has_detection = bool(local_summary)
+
+            for class_name, count in local_summary.items():
+                total_summary[class_name] = total_summary.get(class_name, 0) + count
             
-            if has_detection and saved_frames_count < max_saved_frames:
+            if has_detection:
                 # Save this frame as a "highlight"
                 annotated_frame = result.plot()
                 
                 # Save to disk
-                filename = f"video_frame_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{saved_frames_count}.jpg"
+                filename = f"video_frame_{vid_tag}_{saved_frames_count}.jpg"
                 save_path = reports_dir / filename
                 cv2.imwrite(str(save_path), annotated_frame)
                 
                 key_frame_paths.append(f"static/reports/{filename}")
                 saved_frames_count += 1
-                
-        frame_count += 1
+    
+    # Step between samples with grab() (no colour conversion / copy).
+    # Seeking re-decodes from the previous keyframe, so only seek when the
+    # gap is longer than a GOP. Streams without a frame count (e.g. browser
+    # WebM) are read sequentially until EOF.
+    frame_count = 0
+    next_frame = 0  # index of the frame the next read() returns
+    while total_frames <= 0 or frame_count < total_frames:
+        gap = frame_count - next_frame
+        if total_frames > 0 and gap > SEEK_GOP_FRAMES:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_count)
+        elif not all(cap.grab() for _ in range(gap)):
+            break
+
+        ret, frame = cap.read()
+        if not ret:
+            break
+        next_frame = frame_count + 1
+        frame_count += frame_interval
+
+        batch_frames.append(frame)
+        if len(batch_frames) == VIDEO_BATCH:
+            process_batch(batch_frames)
+            batch_frames = []
+
+            # Enough key frames: skip decoding the rest of the video
+            if saved_frames_count >= max_saved_frames:
+                break
+
+    # Flush remaining partial batch
+    if batch_frames:
+        process_batch(batch_frames)
         
     cap.release()
     return total_summary, key_frame_paths
@@ -290,7 +567,8 @@ def predict():
 
     image = Image.open(file.stream).convert("RGB")
 
-    img_base64, summary = run_inference(image)
+    jpeg_bytes, summary, _ = run_inference(prepare_image(image))
+    img_base64 = base64.b64encode(jpeg_bytes).decode()
 
     # Parse location data
     latitude = request.form.get("latitude")
@@ -311,52 +589,46 @@ def predict():
     else:
         severity = "High"
 
-    # Save annotated image
+    # Save annotated image in the background
     reports_dir = BASE_DIR / "static" / "reports"
     reports_dir.mkdir(parents=True, exist_ok=True)
 
-    filename = f"report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
+    filename = f"report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
     image_path = reports_dir / filename
-    image.save(image_path)
+    submit_io(image_path.write_bytes, jpeg_bytes, description=f"Saving {filename}")
 
     # Auto-Dispatch Logic and Save report to database
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
-    # Determine department based on detected issues
     # Determine department based on detected issues
-    department = "General"
-    for class_name in summary.keys():
-        if "pothole" in class_name.lower():
-            department = "Roads Department"
-            break 
-        elif "garbage" in class_name.lower():
-            department = "Department of Environment"
-            break
+    department = department_for(summary)
 
-    cur.execute("""
-        INSERT INTO reports
-        (image_path, summary, severity, latitude, longitude, created_at, type, department)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        f"static/reports/{filename}",
-        json.dumps(summary),
-        severity,
-        latitude,
-        longitude,
-        datetime.now().isoformat(),
-        'image',
-        department
-    ))
-
-    conn.commit()
-    conn.close()
+    n_pothole, n_garbage = count_issues(summary)
+
+    with DB_LOCK:
+        cur = DB.execute("""
+            INSERT INTO reports
+            (image_path, summary, severity, latitude, longitude, created_at, type, department,
+             n_pothole, n_garbage)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            f"static/reports/{filename}",
+            json.dumps(summary),
+            severity,
+            latitude,
+            longitude,
+            datetime.now().isoformat(),
+            'image',
+            department,
+            n_pothole,
+            n_garbage
+        ))
+        report_id = cur.lastrowid
+    clear_stats_cache()
 
     return jsonify({
         "image": img_base64,
         "summary": summary,
         "severity": severity,
-        "report_id": cur.lastrowid,
+        "report_id": report_id,
         "department": department
     })
 
@@ -392,25 +664,26 @@ def predict_video():
     # For now, let's just save one entry representing the video analysis with the first keyframe as the thumb
     report_id = None
     if key_frames:
-        conn = sqlite3.connect(DB_PATH)
-        cur = conn.cursor()
-        
-        cur.execute("""
-            INSERT INTO reports
-            (image_path, summary, severity, latitude, longitude, created_at, type)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
-            key_frames[0], # Use first detected frame as thumbnail
-            json.dumps(summary),
-            severity,
-            None, None, # No location for video uploads yet
-            datetime.now().isoformat(),
-            'video'
-        ))
-        
-        report_id = cur.lastrowid
-        conn.commit()
-        conn.close()
+        n_pothole, n_garbage = count_issues(summary)
+
+        with DB_LOCK:
+            cur = DB.execute("""
+                INSERT INTO reports
+                (image_path, summary, severity, latitude, longitude, created_at, type,
+                 n_pothole, n_garbage)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                key_frames[0], # Use first detected frame as thumbnail
+                json.dumps(summary),
+                severity,
+                None, None, # No location for video uploads yet
+                datetime.now().isoformat(),
+                'video',
+                n_pothole,
+                n_garbage
+            ))
+            report_id = cur.lastrowid
+        clear_stats_cache()
         
     return render_template("video_result.html", 
         summary=summary, 
@@ -421,31 +694,41 @@ def predict_video():
 
 @app.route("/export-csv")
 def export_csv():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM reports")
-    rows = cur.fetchall()
-    
-    # Get column names
-    column_names = [description[0] for description in cur.description]
-    
-    conn.close()
-    
-    # Generate CSV in memory
-    si = io.StringIO()
-    cw = csv.writer(si)
-    cw.writerow(column_names)
-    cw.writerows(rows)
-    
-    output = io.BytesIO()
-    output.write(si.getvalue().encode('utf-8'))
-    output.seek(0)
-    
-    return send_file(
-        output,
+    """
+    Stream all reports as CSV, one row at a time.
+    Uses its own read connection (WAL allows concurrent readers)
+    so the shared connection is not held for the whole download.
+    """
+    def generate():
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            cur = conn.execute("SELECT * FROM reports")
+
+            buffer = io.StringIO()
+            cw = csv.writer(buffer)
+
+            def emit(row):
+                cw.writerow(row)
+                line = buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+                return line
+
+            # Column names first
+            yield emit([description[0] for description in cur.description])
+
+            for row in cur:
+                yield emit(row)
+        finally:
+            conn.close()
+
+    return Response(
+        stream_with_context(generate()),
         mimetype="text/csv",
-        as_attachment=True,
-        download_name=f"reports_export_{datetime.now().strftime('%Y%m%d')}.csv"
+        headers={
+            "Content-Disposition":
+                f"attachment; filename=reports_export_{datetime.now().strftime('%Y%m%d')}.csv"
+        }
     )
 
 # =====================================================
@@ -462,16 +745,12 @@ def feedback():
     if not report_id or feedback_value not in ("correct", "incorrect"):
         return jsonify({"error": "Invalid feedback"}), 400
 
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
-    cur.execute(
-        "UPDATE reports SET feedback = ? WHERE id = ?",
-        (feedback_value, report_id)
-    )
-
-    conn.commit()
-    conn.close()
+    with DB_LOCK:
+        DB.execute(
+            "UPDATE reports SET feedback = ? WHERE id = ?",
+            (feedback_value, report_id)
+        )
+    clear_stats_cache()
 
     return jsonify({"status": "feedback saved"})
 
@@ -485,52 +764,64 @@ def feedback():
 def history():
     """
     Display report history with stats, maps, and heatmap.
+    Reports are paginated (?page=N); stats and heatmap cover all reports.
     """
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+    try:
+        page = max(int(request.args.get("page", 0)), 0)
+    except ValueError:
+        page = 0
 
-    cur.execute("""
-        SELECT id, image_path, summary, severity, latitude, longitude, created_at, type, department
-        FROM reports
-        ORDER BY id DESC
-    """)
-    rows = cur.fetchall()
+    context = cached(("history", page), lambda: load_history(page))
 
-    conn.close()
+    # Stale link past the end (e.g. after deletes): go to the last page
+    if page > 0 and not context["reports"]:
+        last_page = max(context["stats"]["total_reports"] - 1, 0) // HISTORY_PAGE_SIZE
+        return redirect(f"/history?page={last_page}" if last_page else "/history")
 
-    reports = []
-    heatmap_points = []
+    return render_template("history.html", **context)
 
-    total_reports = len(rows)
-    total_garbage = 0
-    total_pothole = 0
-    no_issue_reports = 0
+def load_history(page: int) -> dict:
+    """
+    Query one history page plus overall stats and heatmap points.
+    """
+    with DB_LOCK:
+        # Fetch one extra row to know whether a next page exists
+        rows = DB.execute("""
+            SELECT id, image_path,
+                   CASE WHEN json_valid(summary) THEN summary END,
+                   severity, latitude, longitude, created_at, type, department
+            FROM reports
+            ORDER BY id DESC
+            LIMIT ? OFFSET ?
+        """, (HISTORY_PAGE_SIZE + 1, page * HISTORY_PAGE_SIZE)).fetchall()
+
+        total_reports, total_garbage, total_pothole, no_issue_reports = DB.execute("""
+            SELECT COUNT(*),
+                   COALESCE(SUM(n_garbage), 0),
+                   COALESCE(SUM(n_pothole), 0),
+                   COALESCE(SUM(COALESCE(summary, '') IN ('', '{}')), 0)
+            FROM reports
+        """).fetchone()
+
+        # Severity-weighted heatmap points as [lat, lng, weight]
+        heatmap_points = DB.execute("""
+            SELECT latitude, longitude,
+                   CASE severity WHEN 'Low' THEN 0.5 WHEN 'Medium' THEN 1.0 ELSE 2.0 END
+            FROM reports
+            WHERE latitude != 0 AND longitude != 0
+        """).fetchall()
+
+    has_next = len(rows) > HISTORY_PAGE_SIZE
+    rows = rows[:HISTORY_PAGE_SIZE]
+
+    reports = []
 
     for row in rows:
-        # Handle new 'department' column safely
-        try:
-             (report_id, image_path, summary, severity, latitude, longitude, created_at, r_type, department) = row
-        except ValueError:
-             # Fallback for old DB structure
-             try:
-                (report_id, image_path, summary, severity, latitude, longitude, created_at, r_type) = row
-                department = "General"
-             except ValueError:
-                (report_id, image_path, summary, severity, latitude, longitude, created_at) = row
-                r_type = 'image'
-                department = "General"
+        (report_id, image_path, summary, severity, latitude, longitude, created_at, r_type, department) = row
 
+        # Totals come from SQL; summaries are only parsed for display
         summary_dict = json.loads(summary) if summary else {}
 
-        if not summary_dict:
-            no_issue_reports += 1
-        else:
-            for key, value in summary_dict.items():
-                if "garbage" in key.lower():
-                    total_garbage += value
-                elif "pothole" in key.lower():
-                    total_pothole += value
-
         reports.append({
             "id": report_id,
             "image_path": image_path,
@@ -543,10 +834,6 @@ def history():
             "department": department if department else "General"
         })
 
-        if latitude and longitude:
-            weight = 0.5 if severity == "Low" else 1.0 if severity == "Medium" else 2.0
-            heatmap_points.append([float(latitude), float(longitude), weight])
-
     summary_stats = {
         "total_reports": total_reports,
         "total_garbage": total_garbage,
@@ -554,12 +841,13 @@ def history():
         "no_issue_reports": no_issue_reports
     }
 
-    return render_template(
-        "history.html",
-        reports=reports,
-        stats=summary_stats,
-        heatmap_points=heatmap_points
-    )
+    return {
+        "reports": reports,
+        "stats": summary_stats,
+        "heatmap_points": heatmap_points,
+        "page": page,
+        "has_next": has_next
+    }
 
 # =====================================================
 # DELETE ROUTES
@@ -570,21 +858,17 @@ def delete_report(report_id):
     """
     Delete a single report and its image.
     """
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
-    cur.execute("SELECT image_path FROM reports WHERE id = ?", (report_id,))
-    row = cur.fetchone()
+    with DB_LOCK:
+        row = DB.execute("SELECT image_path FROM reports WHERE id = ?", (report_id,)).fetchone()
 
-    if row:
-        image_path = BASE_DIR / row[0]
-        if image_path.exists():
-            os.remove(image_path)
+        if row:
+            image_path = BASE_DIR / row[0]
+            if image_path.exists():
+                os.remove(image_path)
 
-        cur.execute("DELETE FROM reports WHERE id = ?", (report_id,))
-        conn.commit()
+            DB.execute("DELETE FROM reports WHERE id = ?", (report_id,))
+    clear_stats_cache()
 
-    conn.close()
     return redirect("/history")
 
 
@@ -593,59 +877,40 @@ def delete_all_reports():
     """
     Delete all reports and images.
     """
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
-    cur.execute("SELECT image_path FROM reports")
-    rows = cur.fetchall()
-
-    for (path,) in rows:
-        img = BASE_DIR / path
-        if img.exists():
-            os.remove(img)
+    with DB_LOCK, transaction() as cur:
+        rows = cur.execute("SELECT image_path FROM reports").fetchall()
+        cur.execute("DELETE FROM reports")
+    clear_stats_cache()
 
-    cur.execute("DELETE FROM reports")
-    conn.commit()
-    conn.close()
+    # Remove image files in parallel, outside the DB lock
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        list(ex.map(lambda row: (BASE_DIR / row[0]).unlink(missing_ok=True), rows))
 
     return redirect("/history")
 
 @app.route("/fix-departments", methods=["GET"])
 def fix_departments():
     """Helper to migrate old department names to new ones"""
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    
-    cur.execute("SELECT id, summary FROM reports")
-    rows = cur.fetchall()
-    
-    count = 0
-    for r in rows:
-        rid, summary_str = r
-        if not summary_str: continue
+    with DB_LOCK, transaction() as cur:
+        cur.execute("SELECT id, summary FROM reports")
+        rows = cur.fetchall()
         
-        try:
-            summary = json.loads(summary_str)
-            new_dept = "unassigned"
-            
-            # Check keys
-            for key in summary.keys():
-                if "pothole" in key.lower():
-                    new_dept = "Roads Department"
-                    break
-                elif "garbage" in key.lower():
-                    new_dept = "Department of Environment"
-                    break
+        count = 0
+        for r in rows:
+            rid, summary_str = r
+            if not summary_str: continue
             
+            # Only skip unparseable summaries; DB errors roll back
+            try:
+                summary = json.loads(summary_str)
+                new_dept = department_for(summary, "unassigned")
+            except (ValueError, TypeError):
+                continue
+                
             if new_dept != "unassigned":
                 cur.execute("UPDATE reports SET department = ? WHERE id = ?", (new_dept, rid))
                 count += 1
-                
-        except:
-            continue
-            
-    conn.commit()
-    conn.close()
+    clear_stats_cache()
     return jsonify({"status": "success", "updated_count": count})
 
 # =====================================================
@@ -656,7 +921,6 @@ if __name__ == "__main__":
     app.run(
         host="127.0.0.1",   # explicit localhost
         port=8000,          # avoids blocked port 5000
-        debug=True
+        debug=True,
+        use_reloader=False  # reloader re-imports this module (2x model load)
     )
-if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000)
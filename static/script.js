@@ -172,7 +172,7 @@ function send(formData) {
             loadingDiv.classList.add("d-none");
             outputDiv.classList.remove("d-none");
 
-            outputImage.src = "data:image/png;base64," + data.image;
+            outputImage.src = "data:image/jpeg;base64," + data.image;
             summaryText.innerText = formatSummary(data.summary);
             updateSeverity(data.severity);
 